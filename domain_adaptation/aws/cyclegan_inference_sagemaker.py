@@ -28,9 +28,13 @@ JOB_NAME = 'cyclegan-inference-sy2su'
 
 INSTANCE_TYPE = 'ml.g5.16xlarge'
 INSTANCE_COUNT = 1
+KEEP_ALIVE_PERIOD = 3600  # Warm pool: keep the instance for reuse between runs (avoids cold start)
+IMAGE_URI = ''  # Optional ECR image with the repo and ckpt baked in (see docker/Dockerfile)
 
 DATA_BUCKET = 'sagemaker-data-aspera'
 DATA_ZIP  = 'pose-estimation/spv2-COCO-xs-200x320.zip'
+INPUT_MODE = 'FastFile'  # 'FastFile' streams objects lazily from S3, 'File' copies everything up front
+DISTRIBUTION = 'ShardedByS3Key'  # Each instance gets a disjoint subset of the input keys
 IMAGES_TYPE = 'sunlamp'
 
 OUTPUT_BUCKET = 'sagemaker-output-aspera'
@@ -74,10 +78,13 @@ estimator = PyTorch(entry_point='cyclegan_inference.py',
                     instance_type=INSTANCE_TYPE,
                     framework_version='2.0.1',
                     py_version='py310',
+                    image_uri=IMAGE_URI or None,
                     hyperparameters=hyperparameters,
                     output_path=f's3://{OUTPUT_BUCKET}/{OUTPUT_PREFIX}',
+                    keep_alive_period_in_seconds=KEEP_ALIVE_PERIOD,
                     tags=TAGS
                     )
 
-training_input = sagemaker.TrainingInput(s3_data=f's3://{DATA_BUCKET}/{DATA_ZIP}', content_type='application/zip')
+training_input = sagemaker.TrainingInput(s3_data=f's3://{DATA_BUCKET}/{DATA_ZIP}', content_type='application/zip',
+                                         input_mode=INPUT_MODE, distribution=DISTRIBUTION)
 estimator.fit({'training': training_input}, job_name=JOB_NAME)
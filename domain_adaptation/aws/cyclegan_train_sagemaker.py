@@ -31,9 +31,12 @@ CONFIGURATION:
 ### CONFIGURATION ###
 INSTANCE_TYPE = 'ml.g5.16xlarge'
 INSTANCE_COUNT = 1
+KEEP_ALIVE_PERIOD = 3600  # Warm pool: keep the instance for reuse between runs (avoids cold start)
+IMAGE_URI = ''  # Optional ECR image with the repo and ckpt baked in (see docker/Dockerfile)
 
 DATA_BUCKET = 'sagemaker-data-aspera'
 DATA_ZIP  = 'cyclegan/cycleGAN-sy2su-300.zip'
+INPUT_MODE = 'FastFile'  # 'FastFile' streams objects lazily from S3, 'File' copies everything up front
 
 OUTPUT_BUCKET = 'sagemaker-output-aspera'
 JOB_NAME = 'cyclegan-turbo-training-sy2su-300' 
@@ -52,6 +55,7 @@ VALIDATION_STEPS = 250
 LAMBDA_GAN = 0.5
 LAMBDA_IDT = 1
 LAMBDA_CYCLE = 1
+NUM_PROCESSES = 1  # DDP processes per instance; set to the GPU count on multi-GPU instances
 
 TAGS = [
     {'Key': 'Owner', 'Value': 'matthieu.marchal@sii.fr'},
@@ -86,7 +90,8 @@ hyperparameters = {
     'validation-steps': VALIDATION_STEPS,
     'lambda-gan': LAMBDA_GAN,
     'lambda-idt': LAMBDA_IDT,
-    'lambda-cycle': LAMBDA_CYCLE
+    'lambda-cycle': LAMBDA_CYCLE,
+    'num-processes': NUM_PROCESSES
 }
 
 estimator = PyTorch(entry_point='cyclegan_train.py',
@@ -96,11 +101,14 @@ estimator = PyTorch(entry_point='cyclegan_train.py',
                     instance_type=INSTANCE_TYPE,
                     framework_version='2.0.1',
                     py_version='py310',
+                    image_uri=IMAGE_URI or None,
                     hyperparameters=hyperparameters,
                     output_path=f's3://{OUTPUT_BUCKET}/{OUTPUT_PREFIX}',
                     environment={'WANDB_API_KEY': WANDB_API_KEY},
+                    keep_alive_period_in_seconds=KEEP_ALIVE_PERIOD,
                     tags=TAGS
                     )
 
-training_input = sagemaker.TrainingInput(s3_data=f's3://{DATA_BUCKET}/{DATA_ZIP}', content_type='application/zip')
+training_input = sagemaker.TrainingInput(s3_data=f's3://{DATA_BUCKET}/{DATA_ZIP}', content_type='application/zip',
+                                         input_mode=INPUT_MODE)
 estimator.fit({'training': training_input}, job_name=JOB_NAME)
@@ -6,6 +6,9 @@ import boto3
 import logging
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 
 """
 AUTHOR: Matthieu Marchal (SII Internship)
@@ -25,17 +28,26 @@ logging.basicConfig(level=logging.INFO)
 subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'])
 
 class PrepareInstance:
+    # Location of the repo when baked into a custom image (see docker/Dockerfile)
+    BAKED_REPO = '/opt/img2img-turbo'
+
     def __init__(self, repo, custom_file='dir_inference_unpaired.py'):
         self.repo = repo
         self.custom_file = custom_file
-        self.path = os.path.join('img2img-turbo/src', custom_file)
 
     def prepare_instance(self):
         logging.info(f'Preparing instance')
-        subprocess.run(['git', 'clone', self.repo], check=True)
+        if os.path.isdir(self.BAKED_REPO):
+            repo_dir = self.BAKED_REPO
+            logging.info(f'Using baked repository at {repo_dir}')
+        else:
+            repo_dir = 'img2img-turbo'
+            # Warm-pool reuse: the repo is still there from the previous run, skip the clone
+            if not os.path.isdir(repo_dir):
+                subprocess.run(['git', 'clone', self.repo], check=True)
         logging.info(f'Moving custom inference file')
-        shutil.move(self.custom_file, self.path)
-        os.chdir('img2img-turbo')
+        shutil.move(self.custom_file, os.path.join(repo_dir, 'src', self.custom_file))
+        os.chdir(repo_dir)
         os.makedirs('ckpt', exist_ok=True)
         logging.info(f'Created {os.path.abspath("data")} and {os.path.abspath("ckpt")}')
         return os.path.abspath('data'), os.path.abspath('ckpt')
@@ -43,7 +55,9 @@ class PrepareInstance:
 
 class PrepareData:
     def __init__(self, base_dir, data_bucket, data_zip, model_ckpt, data_path, ckpt_path):
-        self.s3 = boto3.client('s3')
+        # Multipart, multi-threaded S3 transfers: GB-scale checkpoints download in seconds instead of minutes
+        self.s3 = boto3.client('s3', config=Config(max_pool_connections=64))
+        self.transfer_config = TransferConfig(multipart_threshold=8*1024*1024, multipart_chunksize=64*1024*1024, max_concurrency=32, use_threads=True)
         self.data_bucket = data_bucket
         self.base_dir = base_dir
         self.data_zip =  os.path.basename(data_zip)
@@ -53,18 +67,51 @@ class PrepareData:
         self.ckpt_path = os.path.join(ckpt_path,self.ckpt)
         self.data_path = data_path
 
+    def extract_zip(self, zip_file, dest_path):
+        """Extracts the archive with one ZipFile handle per worker thread (zlib releases the GIL)."""
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            names = zip_ref.namelist()
+        # Pre-create the directory tree so concurrent workers never race on makedirs
+        for name in names:
+            dirname = os.path.dirname(name)
+            if dirname:
+                os.makedirs(os.path.join(dest_path, dirname), exist_ok=True)
+
+        def extract_members(members):
+            with zipfile.ZipFile(zip_file, 'r') as zf:
+                for member in members:
+                    zf.extract(member, dest_path)
+
+        workers = min(32, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(extract_members, names[i::workers]) for i in range(workers)]
+            for future in futures:
+                future.result()
+
     def prepare_data(self):
         logging.info(f'Loading data {self.data_zip} at {self.base_dir}')
         zip_file = os.path.join(self.base_dir, self.data_zip)
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(self.data_path)
-        os.remove(zip_file)
-        logging.info(f'Data has been downloaded and unzipped successfully at {self.data_path}.')
+        if os.path.isfile(zip_file):
+            self.extract_zip(zip_file, self.data_path)
+            try:
+                os.remove(zip_file)
+            except OSError:
+                # A zip served over a FastFile channel sits on a read-only
+                # mount; skipping the cleanup costs nothing
+                logging.info(f'Could not remove {zip_file} (read-only channel), leaving it in place.')
+            logging.info(f'Data has been downloaded and unzipped successfully at {self.data_path}.')
+        else:
+            # FastFile channel: S3 objects are exposed lazily as plain files, nothing to unzip
+            self.data_path = self.base_dir
+            logging.info(f'No archive found, using channel directory {self.data_path} directly.')
         logging.info(f'Checking {self.data_path} directory: {os.listdir(self.data_path)}')
 
-        logging.info(f'Downloading ckpt {self.ckpt} at {self.ckpt_s3} to {self.ckpt_path} ')
-        self.s3.download_file(self.data_bucket, self.ckpt_s3, self.ckpt_path)
-        logging.info(f'Downloaded ckpt file at : {self.ckpt_path}')
+        if os.path.isfile(self.ckpt_path):
+            logging.info(f'Using baked ckpt at {self.ckpt_path}')
+        else:
+            logging.info(f'Downloading ckpt {self.ckpt} at {self.ckpt_s3} to {self.ckpt_path} ')
+            self.s3.download_file(self.data_bucket, self.ckpt_s3, self.ckpt_path, Config=self.transfer_config)
+            logging.info(f'Downloaded ckpt file at : {self.ckpt_path}')
 
         logging.info(f'Chekpoints has been downloaded successfully at {self.ckpt_path}.')
         
@@ -86,7 +133,6 @@ class RunModel:
         
         
     def run_model(self):
-        os.environ['NCCL_P2P_DISABLE'] = '1'
         command = [
             'python', 'src/dir_inference_unpaired.py', '--model_path', f'{self.ckpt_path}', '--image_dir', f'{self.images_path}',
             '--prompt','A 2 B','--direction','a2b','--output_dir',f'{self.output_dir}','--image_prep','no_resize'
@@ -5,6 +5,7 @@ import zipfile
 import logging
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 """
 AUTHOR: Matthieu Marchal (SII Internship)
@@ -24,12 +25,20 @@ logging.basicConfig(level=logging.INFO)
 subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'])
 
 class PrepareInstance:
+    # Location of the repo when baked into a custom image (see docker/Dockerfile)
+    BAKED_REPO = '/opt/img2img-turbo'
+
     def __init__(self, repo):
         self.repo = repo
 
     def prepare_instance(self):
-        subprocess.run(['git', 'clone', self.repo], check=True)
-        os.chdir('img2img-turbo')
+        if os.path.isdir(self.BAKED_REPO):
+            os.chdir(self.BAKED_REPO)
+        else:
+            # Warm-pool reuse: the repo is still there from the previous run, skip the clone
+            if not os.path.isdir('img2img-turbo'):
+                subprocess.run(['git', 'clone', self.repo], check=True)
+            os.chdir('img2img-turbo')
         return os.path.abspath('data')
 
 class PrepareData:
@@ -39,17 +48,49 @@ class PrepareData:
         self.data_folder = self.data_zip.split('.')[0]
         self.path = path
 
+    def extract_zip(self, zip_file, dest_path):
+        """Unzips the dataset using a pool of workers over disjoint member slices."""
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            names = zip_ref.namelist()
+        # Create every target directory up front; zipfile's own makedirs is racy under threads
+        for name in names:
+            dirname = os.path.dirname(name)
+            if dirname:
+                os.makedirs(os.path.join(dest_path, dirname), exist_ok=True)
+
+        def extract_members(members):
+            # ZipFile handles are cheap but not thread-safe, so each worker opens its own
+            with zipfile.ZipFile(zip_file, 'r') as zf:
+                for member in members:
+                    zf.extract(member, dest_path)
+
+        workers = min(32, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(extract_members, names[i::workers]) for i in range(workers)]
+            for future in futures:
+                future.result()
+
     def prepare_data(self):
         logging.info(f'Loading data {self.data_zip} at {self.base_dir}')
         zip_file = os.path.join(self.base_dir, self.data_zip)
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(self.path)
-        os.remove(zip_file)
-        logging.info(f'Data has been downloaded and unzipped successfully at {self.path}.')
+        if os.path.isfile(zip_file):
+            self.extract_zip(zip_file, self.path)
+            try:
+                os.remove(zip_file)
+            except OSError:
+                # FastFile channels are mounted read-only; the archive cannot
+                # be deleted there and keeping it is harmless
+                logging.info(f'Could not remove {zip_file} (read-only channel), leaving it in place.')
+            logging.info(f'Data has been downloaded and unzipped successfully at {self.path}.')
+        else:
+            # FastFile channel: the dataset is streamed lazily from S3 as plain files
+            self.path = self.base_dir
+            logging.info(f'No archive found, using channel directory {self.path} directly.')
         logging.info(f'Checking {self.data_folder} directory: {os.listdir(self.path)}')
+        return self.path
 
 class TrainModel:
-    def __init__(self, model_dir, data_dir, train_img_prep, val_img_prep, learning_rate, max_train_steps, train_batch_size, gradient_accumulation_steps, report_to, tracker_project_name, validation_steps, lambda_gan, lambda_idt, lambda_cycle):
+    def __init__(self, model_dir, data_dir, train_img_prep, val_img_prep, learning_rate, max_train_steps, train_batch_size, gradient_accumulation_steps, report_to, tracker_project_name, validation_steps, lambda_gan, lambda_idt, lambda_cycle, num_processes=1):
         self.model_dir = model_dir
         self.data_dir = data_dir
         self.train_img_prep = train_img_prep
@@ -64,11 +105,21 @@ class TrainModel:
         self.lambda_gan = lambda_gan
         self.lambda_idt = lambda_idt
         self.lambda_cycle = lambda_cycle
+        self.num_processes = num_processes
 
     def train_model(self):
-        os.environ['NCCL_P2P_DISABLE'] = '1'
+        # Leave P2P enabled (disabling it forces GPU-to-GPU traffic through
+        # host memory) and tune the NCCL socket transport instead
+        os.environ['NCCL_DEBUG'] = 'WARN'
+        os.environ['NCCL_SOCKET_NTHREADS'] = '4'
+        os.environ['NCCL_NSOCKS_PERTHREAD'] = '4'
+        launch_args = ['--main_process_port', '29501']
+        if self.num_processes > 1:
+            # One DDP process per GPU with NCCL all-reduce gradient sync
+            launch_args += ['--multi_gpu', f'--num_processes={self.num_processes}',
+                            '--num_machines=1', '--mixed_precision=bf16']
         command = [
-            'accelerate', 'launch', '--main_process_port', '29501', 'src/train_cyclegan_turbo.py',
+            'accelerate', 'launch'] + launch_args + ['src/train_cyclegan_turbo.py',
             '--pretrained_model_name_or_path=stabilityai/sd-turbo',
             f'--output_dir={self.model_dir}',
             f'--dataset_folder={self.data_dir}', f'--max_train_steps={self.max_train_steps}',
@@ -86,9 +137,9 @@ def main(args):
     data_path = prepare_instance.prepare_instance()
     
     prepare_data = PrepareData(args.base_dir, args.data_file, data_path)
-    prepare_data.prepare_data()
-    
-    train_model = TrainModel(args.model_dir, data_path, args.train_img_prep, args.val_img_prep, args.learning_rate, args.max_train_steps, args.train_batch_size, args.gradient_accumulation_steps, args.report_to, args.tracker_project_name, args.validation_steps, args.lambda_gan, args.lambda_idt, args.lambda_cycle)
+    data_path = prepare_data.prepare_data()
+
+    train_model = TrainModel(args.model_dir, data_path, args.train_img_prep, args.val_img_prep, args.learning_rate, args.max_train_steps, args.train_batch_size, args.gradient_accumulation_steps, args.report_to, args.tracker_project_name, args.validation_steps, args.lambda_gan, args.lambda_idt, args.lambda_cycle, args.num_processes)
     train_model.train_model()
 
 if __name__ == '__main__':
@@ -109,6 +160,7 @@ if __name__ == '__main__':
     parser.add_argument('--lambda-gan', type=float, required=True, help='Lambda weight for GAN loss')
     parser.add_argument('--lambda-idt', type=float, required=True, help='Lambda weight for identity loss')
     parser.add_argument('--lambda-cycle', type=float, required=True, help='Lambda weight for cycle-consistency loss')
+    parser.add_argument('--num-processes', type=int, default=1, help='Number of DDP processes (one per GPU on multi-GPU instances)')
 
     args = parser.parse_args()
     main(args)
@@ -12,7 +12,9 @@ NOTE: This script is specific to the SPEED+V2 dataset format.
 import sys
 import os
 import shutil
+import tarfile
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 
 # Update the path to include the root project directory
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -22,6 +24,9 @@ dataset_name = 'cycleGAN-sy2su-300'
 image_number = 300
 image_size = [200, 320]  # Image size to be used (height x width)
 create_zip = True  # Flag to determine if output should be zipped
+upload_to_s3 = False  # Flag to determine if the zipped output should be uploaded to S3
+stream_tar_to_s3 = False  # Stream the output as an uncompressed tar directly to S3 (no local archive)
+s3_max_concurrency = 32  # Number of concurrent threads for the multipart S3 upload
 ### END OF PARAMETERS ###
 
 ### CONFIGURATION ###
@@ -33,12 +38,72 @@ SOURCE_PATH = os.path.join(ROOT_PATH, DATASET_DIR, SOURCE_DIR)
 TARGET_PATH = os.path.join(ROOT_PATH, DATASET_DIR, TARGET_DIR)
 OUTPUT_DIR = f'data/exp/{dataset_name}'
 OUTPUT_PATH = os.path.join(ROOT_PATH, OUTPUT_DIR)
+DATA_BUCKET = 'sagemaker-data-aspera'  # S3 bucket receiving the training ZIP
+S3_KEY = f'cyclegan/{dataset_name}.zip'  # S3 key of the uploaded training ZIP
+S3_TAR_KEY = f'cyclegan/{dataset_name}.tar'  # S3 key of the streamed training tar
 ### END OF CONFIGURATION ###
 
 def zip_output(output_path):
     """Zips the specified directory."""
     shutil.make_archive(output_path, 'zip', output_path)
 
+class S3MultipartWriter:
+    """File-like object streaming sequential writes to S3 as a multipart upload."""
+
+    def __init__(self, bucket, key, part_size=64*1024*1024):
+        import boto3
+        from botocore.config import Config
+        self.s3 = boto3.client('s3', config=Config(max_pool_connections=64))
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = self.s3.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+    def write(self, data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.part_size:
+            self._flush_part(self.buffer[:self.part_size])
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def _flush_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                       PartNumber=part_number, Body=bytes(data))
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def close(self):
+        if self.buffer:
+            self._flush_part(self.buffer)
+            self.buffer.clear()
+        self.s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                          MultipartUpload={'Parts': self.parts})
+
+def stream_output(output_path, bucket, key):
+    """Streams the output directory to S3 as an uncompressed tar, in a single read pass."""
+    writer = S3MultipartWriter(bucket, key)
+    with tarfile.open(mode='w|', fileobj=writer) as tar:
+        for root, dirs, files in os.walk(output_path):
+            for file in files:
+                full_path = os.path.join(root, file)
+                tar.add(full_path, arcname=os.path.relpath(full_path, output_path))
+    writer.close()
+    print(f'Streamed {output_path} to s3://{bucket}/{key}')
+
+def upload_output(zip_path, bucket, key, max_concurrency):
+    """Uploads the zipped dataset to S3 with a multipart, multi-threaded transfer."""
+    import boto3
+    from botocore.config import Config
+    from boto3.s3.transfer import TransferConfig
+
+    s3 = boto3.client('s3', config=Config(max_pool_connections=64))
+    transfer_config = TransferConfig(multipart_threshold=64*1024*1024, multipart_chunksize=64*1024*1024,
+                                     max_concurrency=max_concurrency, use_threads=True)
+    s3.upload_file(zip_path, bucket, key, Config=transfer_config)
+    print(f'Uploaded {zip_path} to s3://{bucket}/{key}')
+
 def write_readme(output_path, dataset_name, image_number, image_size):
     """Generates a README file in the specified directory."""
     file = os.path.join(output_path, 'README.md')
@@ -55,35 +120,82 @@ CycleGAN-turbo network provided by [GaParmar](https://github.com/GaParmar/img2im
 def process_images(image_path, output_dir, image_limit, size):
     """Processes and moves images from source to target directory."""
     images = os.listdir(image_path)[:image_limit]
-    for image in images:
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        import torch
+        import torch.nn.functional as F
+        use_gpu = torch.cuda.is_available()
+    except ImportError:
+        use_gpu = False
+
+    def write_one(item):
+        name, img = item
+        # Level 1 instead of the zlib default (9): the PNGs are transport-only
+        # staging files, so max compression is pure CPU waste
+        cv2.imwrite(os.path.join(output_dir, name), img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+
+    if use_gpu:
+        # SPEED+V2 images all share one resolution, so the whole set can be
+        # decoded in parallel, resized as a single batched GPU kernel, and
+        # re-encoded in parallel
+        import numpy as np
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            arrays = list(executor.map(lambda name: cv2.imread(os.path.join(image_path, name)), images))
+        batch = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).cuda()
+        batch = F.interpolate(batch.float(), size=(size[0], size[1]), mode='area').byte()
+        resized = batch.permute(0, 2, 3, 1).cpu().numpy()
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(write_one, zip(images, resized)))
+        return
+
+    def process_one(image):
         img = cv2.imread(os.path.join(image_path, image))
-        img = cv2.resize(img, (size[1], size[0]))
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        cv2.imwrite(os.path.join(output_dir, image), img)
+        img = cv2.resize(img, (size[1], size[0]), interpolation=cv2.INTER_AREA)
+        write_one((image, img))
+
+    # Decode/resize/encode are independent per file and release the GIL in OpenCV
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(process_one, images))
 
-def build_dataset(source_path, target_path, output_dir, image_number, image_size, create_zip):
+def build_dataset(source_path, target_path, output_dir, image_number, image_size, create_zip, upload=False, stream_tar=False):
     """Builds the dataset from source and target directories."""
     train_A = os.path.join(output_dir, 'train_A')
     train_B = os.path.join(output_dir, 'train_B')
     test_A = os.path.join(output_dir, 'test_A')
     test_B = os.path.join(output_dir, 'test_B')
 
-    # Process and move images
-    process_images(source_path, train_A, image_number, image_size)
-    process_images(target_path, train_B, image_number, image_size)
-    process_images(source_path, test_A, image_number, image_size)
-    process_images(target_path, test_B, image_number, image_size)
+    # Resize each source only once into a staging directory, then link the
+    # results into the train/test splits instead of resizing twice per image
+    stage_A = os.path.join(output_dir, '_stage_A')
+    stage_B = os.path.join(output_dir, '_stage_B')
+    process_images(source_path, stage_A, image_number, image_size)
+    process_images(target_path, stage_B, image_number, image_size)
+    for stage_dir, split_dirs in [(stage_A, (train_A, test_A)), (stage_B, (train_B, test_B))]:
+        for split_dir in split_dirs:
+            os.makedirs(split_dir, exist_ok=True)
+            for name in os.listdir(stage_dir):
+                try:
+                    os.link(os.path.join(stage_dir, name), os.path.join(split_dir, name))
+                except OSError:  # hardlinks unavailable (e.g. cross-device)
+                    shutil.copy(os.path.join(stage_dir, name), os.path.join(split_dir, name))
+        shutil.rmtree(stage_dir)
 
     # Write fixed prompt files
     for prompt_file, content in [('fixed_prompt_a.txt', 'A'), ('fixed_prompt_b.txt', 'B')]:
         with open(os.path.join(output_dir, prompt_file), 'w') as f:
             f.write(content)
 
-    # Optionally zip the output directory
-    if create_zip:
+    # Optionally publish the dataset: either stream it straight to S3 as an
+    # uncompressed tar (no second read of every file, no local archive), or
+    # zip it locally and optionally upload the archive
+    if stream_tar:
+        stream_output(output_dir, DATA_BUCKET, S3_TAR_KEY)
+    elif create_zip:
         zip_output(output_dir)
+        if upload:
+            upload_output(f'{output_dir}.zip', DATA_BUCKET, S3_KEY, s3_max_concurrency)
 
 if __name__ == '__main__':
     write_readme(OUTPUT_PATH, dataset_name, image_number, image_size)
-    build_dataset(SOURCE_PATH, TARGET_PATH, OUTPUT_PATH, image_number, image_size, create_zip)
+    build_dataset(SOURCE_PATH, TARGET_PATH, OUTPUT_PATH, image_number, image_size, create_zip, upload_to_s3, stream_tar_to_s3)
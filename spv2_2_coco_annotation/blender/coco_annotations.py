@@ -2,11 +2,20 @@ import bpy  # type: ignore
 import json
 import os
 import sys
-from bpy_extras.object_utils import world_to_camera_view  # type: ignore
 import mathutils  # type: ignore
 import numpy as np  # We will use numpy for RLE encoding
 import argparse
 
+try:
+    import orjson  # Rust-backed JSON, several times faster than stdlib on large pose files
+except ImportError:
+    orjson = None
+
+try:
+    import cv2  # SIMD resize kernels; the Blender-bundled interpreter may not ship it
+except ImportError:
+    cv2 = None
+
 class ArgumentParserForBlender(argparse.ArgumentParser):
     """
     This class is identical to its superclass, except for the parse_args
@@ -54,7 +63,8 @@ print(f"Autoconfig : {autoconfig}")
 if autoconfig:
     parser = ArgumentParserForBlender()
     parser.add_argument('--root', type=str, required=True, help='Path to the root dir')
-    parser.add_argument('--input-file', type=str, required=True, help='Path to the input file')
+    parser.add_argument('--input-file', type=str, default=None, help='Path to the input file')
+    parser.add_argument('--input-stdin', action='store_true', help='Read the input poses from stdin instead of a file')
     parser.add_argument('--output-file', type=str, required=True, help='Path to the output file')
     parser.add_argument('--render-mask', type=bool, default=False, help='Render segmentation mask')
     parser.add_argument('--image-height', type=int, default=200, help='Image height')
@@ -62,6 +72,7 @@ if autoconfig:
     args = parser.parse_args()
     ROOT_PATH = args.root
     FILE = args.input_file
+    INPUT_STDIN = args.input_stdin
     OUTPUT_PATH = args.output_file
     RENDER_MASK = args.render_mask
     IMAGE_SIZE = [int(args.image_height), int(args.image_width)]
@@ -71,6 +82,7 @@ else :
     ##### MANUAL CONFIGURATION ##### 
     ### PARAMETERS ###
     RENDER_MASK = False
+    INPUT_STDIN = False
     ### END OF PARAMETERS ###
 
     ### CONFIGURATION ###
@@ -99,19 +111,23 @@ class CocoProcessor:
         self.satellite_object = bpy.data.objects['satellite_object']
         bpy.context.view_layer.objects.active = self.satellite_object
         self.satellite_object.select_set(True)
+        # The rotation mode never changes, so set it once here
+        self.satellite_object.rotation_mode = 'QUATERNION'
 
         # Set up rendering parameters
         bpy.context.scene.world.color = (0, 0, 0)  # Set the world background color to black
         bpy.context.scene.render.engine = 'BLENDER_WORKBENCH'
         bpy.context.scene.display.shading.light = 'FLAT'
         bpy.context.scene.display.shading.color_type = 'MATERIAL'
-        bpy.context.scene.render.image_settings.file_format = 'JPEG'
+        bpy.context.scene.render.image_settings.file_format = 'PNG'  # lossless: JPEG noise distorts the mask threshold
         bpy.context.scene.render.resolution_x = self.image_width
         bpy.context.scene.render.resolution_y = self.image_height
 
         # Scene setup
         self.scene = bpy.context.scene
         self.cam = bpy.data.objects['Camera']
+        # Resolve the keypoint objects once; poses never change which objects exist
+        self.keypoint_objects = [bpy.data.objects[name] for name in self.keypoints_name]
     
     def getDatasetInfo(self):
         """ Get dataset information. """
@@ -144,18 +160,25 @@ class CocoProcessor:
         })
         return image_info
     
+    def bakePoseKeyframes(self):
+        """ Bake every pose onto the animation timeline, one frame per pose. """
+        for frame, pose in enumerate(self.poses, start=1):
+            self.satellite_object.location = pose['r_Vo2To_vbs_true']
+            self.satellite_object.rotation_quaternion = pose['q_vbs2tango_true']
+            self.satellite_object.keyframe_insert(data_path='location', frame=frame)
+            self.satellite_object.keyframe_insert(data_path='rotation_quaternion', frame=frame)
+        self.scene.frame_start = 1
+        self.scene.frame_end = max(len(self.poses), 1)
+
     def getAnnotations(self,pose,id):
         """ Process pose to extract keypoints and render segmentation masks. """
-        # Update object location and rotation based on pose data
-        self.satellite_object.location = pose['r_Vo2To_vbs_true']
-        self.satellite_object.rotation_mode = 'QUATERNION'
-        self.satellite_object.rotation_quaternion = pose['q_vbs2tango_true']
-        
-        # Prepare camera and scene objects
-        bpy.context.view_layer.update()
+        # Jump to the pose's baked frame: the depsgraph computes the incremental
+        # update itself instead of a manual assignment + full view-layer update
+        self.scene.frame_set(id)
+        depsgraph = bpy.context.evaluated_depsgraph_get()
 
         # Extract keypoint coordinates
-        keypoints,nl= self.getkeypoints()
+        keypoints,nl= self.getkeypoints(depsgraph)
         bbox,area = self.getBoundingBox(keypoints)
 
         # Render segmentation mask 
@@ -180,20 +203,37 @@ class CocoProcessor:
         })
         return annotation
     
-    def getkeypoints(self):
+    def getkeypoints(self, depsgraph):
         # Initialize keypoint details
-        keypoints = [bpy.data.objects[name] for name in self.keypoints_name]
+        keypoints = self.keypoint_objects
+        world_locations = [keypoint.matrix_world.translation.copy() for keypoint in keypoints]
+
+        # Project every keypoint with one batched matrix multiply instead of a
+        # world_to_camera_view call per keypoint (same math as bpy_extras)
+        cam_inv = np.array(self.cam.matrix_world.normalized().inverted())
+        world_h = np.concatenate([np.array(world_locations), np.ones((len(world_locations), 1))], axis=1)
+        co_local = world_h @ cam_inv.T
+        z = -co_local[:, 2]
+
+        frame = self.cam.data.view_frame(scene=self.scene)[:3]
+        if self.cam.data.type != 'ORTHO':
+            # Perspective camera: the view frame scales with depth along the view axis
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scale = -z / frame[0].z
+        else:
+            scale = np.ones_like(z)
+        min_x, max_x = frame[2].x * scale, frame[1].x * scale
+        min_y, max_y = frame[1].y * scale, frame[0].y * scale
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xs = (co_local[:, 0] - min_x) / (max_x - min_x)
+            ys_flipped = (co_local[:, 1] - min_y) / (max_y - min_y)
+        xs = np.where(z == 0, 0.5, xs)
+        ys_flipped = np.where(z == 0, 0.5, ys_flipped)
+        ys = 1 - ys_flipped  # flip y-coordinate to have correct 2D frame
+
         keypoint_info = []
         nl = 0
-        for keypoint in keypoints:
-            world_location = keypoint.matrix_world.translation
-            coord = world_to_camera_view(self.scene, self.cam, world_location)
-            x, y_flipped = coord.x, coord.y
-            y = 1 - y_flipped  # flip y-coordinate to have correct 2D frame
-            
-            # Get the depsgraph
-            depsgraph = bpy.context.evaluated_depsgraph_get()
-
+        for keypoint, world_location, x, y in zip(keypoints, world_locations, xs, ys):
             # Set up the ray casting from the camera
             ray_origin = self.cam.location
             ray_target = world_location  # keypoint's world location
@@ -238,17 +278,15 @@ class CocoProcessor:
         float: Area of the bounding box.
         """
         # Filter out keypoints where visibility v is 0 (not labeled or not visible)
-        visible_points = [(keypoints[i], keypoints[i+1]) for i in range(0, len(keypoints), 3) if keypoints[i+2] > 0]
-
-        if not visible_points:
-            return [0, 0, 0, 0]  # No visible points, return an empty box
+        arr = np.asarray(keypoints, dtype=np.int32).reshape(-1, 3)
+        visible = arr[arr[:, 2] > 0]
 
-        # Unzip the list of tuples into two lists, one for x coordinates and one for y coordinates
-        x_values, y_values = zip(*visible_points)
+        if len(visible) == 0:
+            return [0, 0, 0, 0], 0  # No visible points, return an empty box
 
-        # Calculate the minimum and maximum x and y coordinates
-        min_x, max_x = int(min(x_values)), int(max(x_values))
-        min_y, max_y = int(min(y_values)), int(max(y_values))
+        # Min/max over both coordinates in one numpy pass
+        min_x, min_y = visible[:, :2].min(axis=0)
+        max_x, max_y = visible[:, :2].max(axis=0)
 
         # Compute width and height of the bounding box
         width = int(max_x - min_x)
@@ -257,7 +295,7 @@ class CocoProcessor:
         # Compute the area of the bounding box
         area = int(width * height)
 
-        return [min_x, min_y, width, height], area
+        return [int(min_x), int(min_y), width, height], area
     
     def getSegmentationMask(self):
         """Render the segmentation mask for the object."""
@@ -268,19 +306,28 @@ class CocoProcessor:
         # Process the render result
         render_result = bpy.data.images.get('Render Result')
         if render_result is not None:
-            full_path =  os.path.join(ROOT_PATH, OUTPUT_DIR, 'temporary_mask.jpg')
-            render_result.save_render(filepath=full_path)
-            image = bpy.data.images.load(full_path)
-            pixels = np.array(image.pixels)
-
-            mask = (pixels[::4] > 0.3).astype(int).reshape(image.size[0], image.size[1])
-            mask = self.nearestNeighborResize(mask,[image.size[0],image.size[1]])
+            try:
+                # Read straight from the render buffer: no file round-trip, no codec pass
+                pixels = np.array(render_result.pixels[:], dtype=np.float32)
+                size = [render_result.size[0], render_result.size[1]]
+            except RuntimeError:
+                pixels = np.empty(0)
+            if pixels.size == 0:
+                # The render buffer is not readable in some configurations (e.g.
+                # background mode); fall back to a lossless PNG round-trip
+                full_path = os.path.join(os.path.dirname(OUTPUT_PATH), 'temporary_mask.png')
+                render_result.save_render(filepath=full_path)
+                image = bpy.data.images.load(full_path)
+                pixels = np.array(image.pixels)
+                size = [image.size[0], image.size[1]]
+                # Clean up by removing the image from memory
+                bpy.data.images.remove(image)
+
+            mask = (pixels[::4] > 0.3).astype(int).reshape(size[0], size[1])
+            mask = self.nearestNeighborResize(mask, size)
             rle_mask = self.encodeRLE(mask)
 
             mask_data = dict({"size": [self.image_height, self.image_width], "counts": rle_mask})
-            
-            # Clean up by removing the image from memory
-            bpy.data.images.remove(image)
             return mask_data
  
     def nearestNeighborResize(self,img, new_shape):
@@ -289,6 +336,9 @@ class CocoProcessor:
         img: Binary image (numpy array)
         new_shape: tuple of (new_height, new_width)
         """
+        if cv2 is not None:
+            return cv2.resize(img.astype(np.uint8), (new_shape[1], new_shape[0]), interpolation=cv2.INTER_NEAREST)
+
         old_shape = img.shape
         row_ratio, col_ratio = old_shape[0] / new_shape[0], old_shape[1] / new_shape[1]
 
@@ -314,20 +364,15 @@ class CocoProcessor:
         mask = mask.T
         # Flatten the mask
         mask = mask.flatten()
-        # Initialize variables
-        rle = []
-        count = 1
-        color = 0
-        # Iterate over the mask
-        for i in range(1, len(mask)):
-            if mask[i] == color:
-                count += 1
-            else:
-                rle.append(count)
-                color = mask[i]
-                count = 1
-        rle.append(count)
-        return rle
+        # Run boundaries are the indices where the pixel value changes;
+        # the run lengths are the distances between consecutive boundaries
+        idx = np.flatnonzero(np.diff(mask)) + 1
+        runs = np.diff(np.concatenate(([0], idx, [mask.size])))
+        # RLE counts start with the number of leading background pixels, so
+        # prepend an empty zero-run when the mask starts with foreground
+        if mask.size and mask[0] != 0:
+            return [0] + runs.tolist()
+        return runs.tolist()
     
     def getCategories(self):
         categories = dict({
@@ -339,31 +384,59 @@ class CocoProcessor:
         })
         return categories
     
-    def process(self):
-        self.coco_file['info'] = self.getDatasetInfo()
-        self.coco_file['licenses'] = self.getLicenseInfo()
+    def iterAnnotations(self):
+        """ Yield (image_info, annotation) per pose without accumulating them in memory. """
+        self.bakePoseKeyframes()
         id = 0
-        
-        poses = self.poses
-        for pose in poses:
+        for pose in self.poses:
             id+=1
             #pose = pose['pose']
-            self.coco_file['images'].append(self.getImageInfo(pose,id))
-            self.coco_file['annotations'].append(self.getAnnotations(pose,id))
-        
+            yield self.getImageInfo(pose,id), self.getAnnotations(pose,id)
+
+    def process(self):
+        self.coco_file['info'] = self.getDatasetInfo()
+        self.coco_file['licenses'] = self.getLicenseInfo()
+
+        for image_info, annotation in self.iterAnnotations():
+            self.coco_file['images'].append(image_info)
+            self.coco_file['annotations'].append(annotation)
+
         self.coco_file['categories'].append(self.getCategories())
         return self.coco_file
 
 if __name__ == "__main__":
 
-    print(f"Processing {FILE}")
-    with open(FILE, 'r') as file:
-        data = json.load(file)
-    
-    
+    if INPUT_STDIN:
+        # The caller pipes the poses straight in, skipping the itmp.json round-trip
+        print("Processing poses from stdin")
+        raw = sys.stdin.buffer.read()
+        data = orjson.loads(raw) if orjson else json.loads(raw)
+    else:
+        print(f"Processing {FILE}")
+        with open(FILE, 'rb') as file:
+            data = orjson.loads(file.read()) if orjson else json.load(file)
+
+    def dumps(obj):
+        if orjson:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(obj).encode('utf-8')
+
     coco_processor = CocoProcessor(data)
-    coco_file = coco_processor.process()
-    
-    with open(OUTPUT_PATH, 'w') as file:
-        json.dump(coco_file, file)
+
+    # Stream annotations to disk as they are produced instead of building the
+    # whole COCO dict in memory first; only the small image-info records are
+    # buffered (their array interleaves with the annotation stream)
+    # 1 MiB buffer coalesces the many small per-annotation writes into few syscalls
+    with open(OUTPUT_PATH, 'wb', buffering=1<<20) as file:
+        file.write(b'{"info":' + dumps(coco_processor.getDatasetInfo()))
+        file.write(b',"licenses":' + dumps(coco_processor.getLicenseInfo()))
+        file.write(b',"categories":' + dumps([coco_processor.getCategories()]))
+        file.write(b',"annotations":[')
+        images = []
+        for i, (image_info, annotation) in enumerate(coco_processor.iterAnnotations()):
+            if i:
+                file.write(b',')
+            file.write(dumps(annotation))
+            images.append(image_info)
+        file.write(b'],"images":' + dumps(images) + b'}')
     print(f"Blender results saved to {OUTPUT_PATH}")
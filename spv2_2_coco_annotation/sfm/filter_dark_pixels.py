@@ -22,10 +22,12 @@ MODIFICATIONS:
 """
 
 import os
+import cv2
 import numpy as np
 from PIL import Image, ImageFilter, ImageEnhance
 import matplotlib.pyplot as plt
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import shutil
 from tqdm import tqdm
 
@@ -65,55 +67,77 @@ def calculateDarkPixelPercentage(image_array: np.ndarray, DARKNESS_THRESHOLD: in
     Returns:
         The percentage of dark pixels in the image.
     """
-    dark_pixels = np.sum(image_array < DARKNESS_THRESHOLD)
+    dark_pixels = np.count_nonzero(image_array < DARKNESS_THRESHOLD)
     total_pixels = image_array.size
     return (dark_pixels / total_pixels) * 100
 
-def enhanceImage(img: Image, RESIZE_FACTOR: float, BLUR_RADIUS: int, CONTRAST_FACTOR: float) -> Image:
+def enhanceImage(img_np: np.ndarray, RESIZE_FACTOR: float, BLUR_RADIUS: int, CONTRAST_FACTOR: float) -> np.ndarray:
     """
-    Apply a Gaussian Blur filter and adjust contrast of an image to reduce graininess and enhance its features.
-    
+    Apply a box blur and adjust contrast of a grayscale image to reduce graininess and enhance its features.
+
     Args:
-    - img: The input PIL Image object.
-    - RESIZE_FACTOR: Factor to resize the image by before applying enhancements. 
+    - img_np: The input grayscale image as a uint8 numpy array.
+    - RESIZE_FACTOR: Factor to resize the image by before applying enhancements.
                      Less than 1 to reduce size, 1 to keep size unchanged.
-    - BLUR_RADIUS: The radius of the Gaussian Blur to apply.
-    - CONTRAST_FACTOR: Factor by which the image contrast will be increased. 
+    - BLUR_RADIUS: The radius of the box blur to apply.
+    - CONTRAST_FACTOR: Factor by which the image contrast will be increased.
                        A value of 1 will leave the contrast unchanged, while values greater than 1 will increase contrast.
-    
+
     Returns:
-    - The enhanced PIL Image object.
+    - The enhanced image as a uint8 numpy array.
     """
     # Optionally resize the image to reduce the noise/grain
     if RESIZE_FACTOR != 1:
-        new_size = (int(img.width * RESIZE_FACTOR), int(img.height * RESIZE_FACTOR))
-        img = img.resize(new_size)
-    
-    # Apply Gaussian Blur to smooth the image
-    img = img.filter(ImageFilter.BoxBlur(BLUR_RADIUS))
-    
-    # Adjust the contrast of the image
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(CONTRAST_FACTOR)
-    
-    return img
+        new_size = (int(img_np.shape[1] * RESIZE_FACTOR), int(img_np.shape[0] * RESIZE_FACTOR))
+        img_np = cv2.resize(img_np, new_size, interpolation=cv2.INTER_AREA)
+
+    # Apply a box blur to smooth the image (kernel width matches PIL's BoxBlur radius)
+    img_np = cv2.blur(img_np, (2 * BLUR_RADIUS + 1, 2 * BLUR_RADIUS + 1))
+
+    # Adjust the contrast of the image around its mean luminance, matching
+    # PIL's ImageEnhance.Contrast; a fixed 128 pivot would flip the stretch
+    # direction on these mostly-dark images
+    pivot = round(float(img_np.mean()))
+    img_np = np.clip((img_np.astype(np.int16) - pivot) * CONTRAST_FACTOR + pivot, 0, 255).astype(np.uint8)
+
+    return img_np
+
+def processOneImage(file_name: str, source_path: str, RESIZE_FACTOR: float, BLUR_RADIUS: int, CONTRAST_FACTOR: float, DARKNESS_THRESHOLD: int) -> Tuple[str, float]:
+    """
+    Compute the dark pixel percentage of a single image (process pool worker).
+    """
+    image_path = os.path.join(source_path, file_name)
+    # Decode at 1/2, 1/4 or 1/8 resolution when RESIZE_FACTOR allows it: the JPEG
+    # decoder decimates during decode, leaving only a small residual resize.
+    decode_flag, decode_scale = cv2.IMREAD_GRAYSCALE, 1
+    for scale, flag in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+                        (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                        (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if RESIZE_FACTOR <= 1 / scale:
+            decode_flag, decode_scale = flag, scale
+            break
+    img_np = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), decode_flag)
+    if img_np is None:
+        raise IOError(f"Cannot decode {file_name}.")
+    smooth_gray_image = enhanceImage(img_np, RESIZE_FACTOR * decode_scale, BLUR_RADIUS, CONTRAST_FACTOR)
+    dark_pixel_percentage = calculateDarkPixelPercentage(smooth_gray_image, DARKNESS_THRESHOLD)
+    return file_name, dark_pixel_percentage
+
 def processImagesInFolder(source_path: str, RESIZE_FACTOR: float, BLUR_RADIUS: int,CONTRAST_FACTOR: float, DARKNESS_THRESHOLD: int) -> List[Tuple[str, float]]:
     file_data = []
-    files = os.listdir(source_path)
+    files = [f for f in os.listdir(source_path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
     print(f"Processing images in {source_path}...")
-    with tqdm(total=len(files), desc="Processing") as pbar:
-        for file_name in files:
-            if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+    # Decode + filtering is CPU-bound, so a process pool scales with the core count
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {executor.submit(processOneImage, file_name, source_path, RESIZE_FACTOR, BLUR_RADIUS, CONTRAST_FACTOR, DARKNESS_THRESHOLD): file_name
+                   for file_name in files}
+        with tqdm(total=len(files), desc="Processing") as pbar:
+            for future in as_completed(futures):
                 try:
-                    image_path = os.path.join(source_path, file_name)
-                    with Image.open(image_path) as img:
-                        gray_image = img.convert('L')
-                        smooth_gray_image = enhanceImage(gray_image, RESIZE_FACTOR, BLUR_RADIUS, CONTRAST_FACTOR)
-                        dark_pixel_percentage = calculateDarkPixelPercentage(np.array(smooth_gray_image), DARKNESS_THRESHOLD)
-                        file_data.append((file_name, dark_pixel_percentage))
+                    file_data.append(future.result())
                 except IOError:
-                    print(f"Cannot open {file_name}.")
-            pbar.update(1)
+                    print(f"Cannot open {futures[future]}.")
+                pbar.update(1)
     return file_data
 
 def enhancedVisualization(file_data: List[Tuple[str, float]], source_path: str, intervals: List[Tuple[int, int]] = [(0, 10), (10,20), (20, 30), (30,40), (40, 50), (50,60), (60, 70), (70,80), (80, 90), (90, 100)]):
@@ -169,12 +193,12 @@ def modifyAndCopyImages(file_data: List[Tuple[str, float]], source_path: str, de
     with tqdm(total=len(file_data), desc="Selecting and copying") as pbar:
         for file_name, dark_percentage in file_data:
             if DARKNESS_LB < dark_percentage < DARKNESS_HB:
-                source_path = os.path.join(source_path, file_name)
+                src = os.path.join(source_path, file_name)
                 save_path = os.path.join(destination_path, file_name)
                 c+=1
                 try:
                     # Open source image
-                    with Image.open(source_path) as img:
+                    with Image.open(src) as img:
                         # Apply Gaussian Blur
                         img = img.filter(ImageFilter.GaussianBlur(BLUR_RADIUS))
 
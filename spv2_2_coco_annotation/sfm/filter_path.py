@@ -20,8 +20,9 @@ CONFIGURATION :
 import numpy as np
 import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from matplotlib import pyplot as plt
-from PIL import Image
 from scipy.spatial.transform import Rotation as R
 from mpl_toolkits.mplot3d import Axes3D
 from scipy.spatial.distance import cdist
@@ -72,37 +73,55 @@ def getCartesianCoordinates(azimuth, elevation, r=1):
 def filterByDistanceAndSphericalCoverage(data, distance_range):
     """Filter images based on distance and spherical coverage."""
     segments = {(az, el): [] for az in range(AZIMUTH_SEGMENTS) for el in range(ELEVATION_SEGMENTS)}
-    
-    for item in data:
-        image_full_path = os.path.join(IMAGE_PATH, item["filename"])
-        if os.path.exists(image_full_path):
-            r = np.array(item["r_Vo2To_vbs_true"])
-            distance = np.linalg.norm(r)
-            if distance_range[0] <= distance <= distance_range[1]:
-                q = item["q_vbs2tango_true"]
-                azimuth, elevation = toSphericalCoordinates(q)
-                az_index = int(((azimuth) % (2 * np.pi)) / ((2 * np.pi) / AZIMUTH_SEGMENTS))
-                el_index = int((elevation + np.pi) / (2 * np.pi / ELEVATION_SEGMENTS))
-                segment_key = (az_index, el_index)
-                segments[segment_key].append((item["filename"], q, r))
+    if not data:
+        return []
+
+    # Batch all poses: one vectorized norm and one batched quaternion conversion
+    # instead of per-item scipy calls
+    rs = np.asarray([item["r_Vo2To_vbs_true"] for item in data])
+    qs = np.asarray([item["q_vbs2tango_true"] for item in data])
+    distances = np.linalg.norm(rs, axis=1)
+    eulers = R.from_quat(qs).as_euler('zyx', degrees=False)
+    azimuths = eulers[:, 0]
+    elevations = eulers[:, 1]
+    az_indices = ((azimuths % (2 * np.pi)) / ((2 * np.pi) / AZIMUTH_SEGMENTS)).astype(int)
+    el_indices = ((elevations + np.pi) / (2 * np.pi / ELEVATION_SEGMENTS)).astype(int)
+    distance_mask = (distances >= distance_range[0]) & (distances <= distance_range[1])
+
+    # One directory read instead of a stat syscall per pose
+    existing = {entry.name for entry in os.scandir(IMAGE_PATH)}
+    for i in np.flatnonzero(distance_mask):
+        item = data[i]
+        if item["filename"] in existing:
+            segment_key = (int(az_indices[i]), int(el_indices[i]))
+            segments[segment_key].append((item["filename"], qs[i], rs[i]))
 
     selected_images = [img for segment_images in segments.values() for img in segment_images if len(segment_images) > 0]
     return selected_images
 
 def findShortestPath(selected_images):
     """Find the shortest path through selected images using a greedy approach."""
-    points = np.array([getCartesianCoordinates(*toSphericalCoordinates(q)) for _, q, _ in selected_images])
+    # One batched quaternion conversion and trig pass over all poses
+    qs = np.array([q for _, q, _ in selected_images])
+    eulers = R.from_quat(qs).as_euler('zyx', degrees=False)
+    azimuths = eulers[:, 0]
+    elevations = eulers[:, 1]
+    cos_el = np.cos(elevations)
+    points = np.stack([cos_el * np.cos(azimuths), cos_el * np.sin(azimuths), np.sin(elevations)], axis=1)
 
     distance_matrix = cdist(points, points)
     
     num_images = len(selected_images)
-    visited = [False] * num_images
+    visited = np.zeros(num_images, dtype=bool)
     path = [0]
     visited[0] = True
 
     for _ in range(1, num_images):
         last = path[-1]
-        next_point = np.argmin([distance_matrix[last][j] if not visited[j] else np.inf for j in range(num_images)])
+        # Masked argmin in C instead of rebuilding a Python list per step
+        dists = distance_matrix[last].copy()
+        dists[visited] = np.inf
+        next_point = int(np.argmin(dists))
         path.append(next_point)
         visited[next_point] = True
     return path
@@ -110,11 +129,17 @@ def findShortestPath(selected_images):
 def saveImages(selected_images, save_path, tsp_path):
     """Save the selected images in TSP order."""
     os.makedirs(save_path, exist_ok=True)
-    for i, index in enumerate(tsp_path):
+
+    def copyOne(args):
+        i, index = args
         filename, _, _ = selected_images[index]
         img_path = os.path.join(IMAGE_PATH, filename)
-        img = Image.open(img_path)
-        img.save(os.path.join(save_path, f"{i:03d}_{filename}"))
+        # Raw copy: no decode/re-encode, and lossless for JPEG inputs
+        shutil.copyfile(img_path, os.path.join(save_path, f"{i:03d}_{filename}"))
+
+    # Threads overlap the disk I/O; the GIL is released during file reads/writes
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(copyOne, enumerate(tsp_path)))
 
     print(f"Images saved to {save_path} in TSP order")
 
@@ -26,27 +26,16 @@ sfm_results_file =''
 ###
 
 
-def findRotationInGroundTruth(item):
-    q_vbs2tango_true = item['q_vbs2tango_true']
-    rotation_matrix = R.from_quat(q_vbs2tango_true).as_matrix()
-    return rotation_matrix
-
-def findRotationInResults(filename, views, extrinsics):
-    for view in views:
-        if view['value']['ptr_wrapper']['data']['filename'] == filename:
-            key = view.get('key')
-            for extrinsic in extrinsics:
-                if extrinsic['key'] == key:
-                    rotation_matrix = extrinsic['value']['rotation']
-                    rotation_matrix=R.from_matrix(rotation_matrix).as_matrix()
-                    return rotation_matrix
-
 def rotationMatrixAverage(rotation_matrices):
     if len(rotation_matrices) == 0:
         return None
-    A = np.sum([np.outer(r[:, i], r[:, i]) for r in rotation_matrices for i in range(3)], axis=0)
+    # Sum of all column outer products in one einsum instead of 3N Python outer calls
+    rotations = np.asarray(rotation_matrices)
+    A = np.einsum('nji,nki->jk', rotations, rotations)
     U, _, Vt = np.linalg.svd(A)
-    mean_rotation = np.dot(U, Vt)
+    if np.linalg.det(U @ Vt) < 0:
+        Vt[-1] *= -1  # keep a proper rotation (det +1)
+    mean_rotation = U @ Vt
     return mean_rotation
 
 def visualizeRotations(relative_rotations,mean_global_rotation, filenames):
@@ -90,24 +79,28 @@ def main(ground_truth_file, results_file):
 
     views = results_data['views']
     extrinsics = results_data['extrinsics']
-    
-    relative_rotations = []
-    filenames = []
-    m=0
-    
-    # Calculate the relative rotations
-    for item in ground_truth_data:
-        filename = item['filename']
-        filenames.append(filename)
-        ground_truth_rotation = findRotationInGroundTruth(item)
-        result_rotation = findRotationInResults(filename, views, extrinsics)
-        
-        if ground_truth_rotation is not None and result_rotation is not None:
-            print(f'found matched filename: {filename}')
-            m+=1
-            relative_rotation = ground_truth_rotation.T@result_rotation
-            relative_rotations.append(relative_rotation)
+
+    # Index the SfM results once so each ground-truth lookup is O(1)
+    view_by_name = {view['value']['ptr_wrapper']['data']['filename']: view.get('key') for view in views}
+    rot_by_key = {extrinsic['key']: extrinsic['value']['rotation'] for extrinsic in extrinsics}
+
+    # Convert every ground-truth quaternion in one batched scipy call
+    filenames = [item['filename'] for item in ground_truth_data]
+    qs = np.array([item['q_vbs2tango_true'] for item in ground_truth_data])
+    ground_truth_rotations = R.from_quat(qs).as_matrix()
+
+    matched = [i for i, filename in enumerate(filenames) if view_by_name.get(filename) in rot_by_key]
+    for i in matched:
+        print(f'found matched filename: {filenames[i]}')
+    m = len(matched)
     print(f"Number of matching poses: {m}")
+
+    # Calculate the relative rotations (R_gt^T @ R_res) for all matches at once
+    result_rotations = np.array([rot_by_key[view_by_name[filenames[i]]] for i in matched])
+    if m > 0:
+        relative_rotations = np.einsum('nji,njk->nik', ground_truth_rotations[matched], result_rotations)
+    else:
+        relative_rotations = np.empty((0, 3, 3))
     
     # Calculate the mean global rotation from the relative rotations
     mean_global_rotation = rotationMatrixAverage(np.array(relative_rotations))
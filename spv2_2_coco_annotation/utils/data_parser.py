@@ -1,13 +1,31 @@
 import sys
 import os
+import hashlib
 import shutil
-import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 from tqdm import tqdm
 import subprocess
 import json
 import cv2
+import numpy as np
 import zipfile
 
+try:
+    import orjson  # Rust-backed parser, several times faster than stdlib json
+except ImportError:
+    orjson = None
+
+try:
+    # libjpeg-turbo bindings: SIMD Huffman/IDCT paths and scaled decoding,
+    # noticeably faster than OpenCV's bundled libjpeg
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 def loadJson(json_path):
@@ -21,27 +39,33 @@ def loadJson(json_path):
     - data: The JSON data.
     """
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            data = orjson.loads(f.read()) if orjson is not None else json.loads(f.read())
         return data
     except FileNotFoundError:
         print(f"Error: The file at {json_path} was not found.")
         return None
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, ValueError):
         print("Error: Failed to decode the JSON file.")
         return None
 
-def saveJson(data, json_path):
+def saveJson(data, json_path, pretty=True):
     """
     Saves a JSON file.
 
     Parameters:
     - data: The JSON data.
     - json_path: Path to the JSON file.
+    - pretty: Whether to indent the output. Compact output roughly halves
+      the file size of large COCO annotation dumps. Default: True.
     """
     try:
-        with open(json_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        if orjson is not None:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+        else:
+            payload = json.dumps(data, indent=2 if pretty else None).encode()
+        with open(json_path, 'wb') as f:
+            f.write(payload)
             print(f"Step Completed: JSON data saved to {json_path}.")
     except Exception as e:
         print(f"Error: {e}")
@@ -62,9 +86,10 @@ class DatasetParser:
     - test_ratio: The ratio of test data. Default: 0.15.
     - image_size: The size of the images. Default: [200, 640].
     - zip_output: Whether to zip the output directory. Default: True.
+    - seed: Seed for the sampling generator. Default: 0.
     """
 
-    def __init__(self, root_dir, data_dir, output_dir, blender_params, data_type, sample_size=0.25, train_ratio=0.7, val_ratio=0.15, test_ratio=0.15, image_size=[200, 320], zip_output=False):
+    def __init__(self, root_dir, data_dir, output_dir, blender_params, data_type, sample_size=0.25, train_ratio=0.7, val_ratio=0.15, test_ratio=0.15, image_size=[200, 320], zip_output=False, seed=0):
         self.root_dir = root_dir
         self.data_dir = data_dir
         self.data_type = data_type
@@ -77,6 +102,7 @@ class DatasetParser:
         self.tsr = test_ratio
         self.isz = image_size
         self.zo = zip_output
+        self.seed = seed
 
         os.makedirs(self.output_dir, exist_ok=True)
         print(f"=== Initializing DatasetParser ===")
@@ -90,6 +116,7 @@ class DatasetParser:
         print(f"Test Ratio: {self.tsr}")
         print(f"Image Size: {self.isz}")
         print(f"Zip Output: {self.zo}")
+        print(f"Seed: {self.seed}")
         print(f"=== Initialization Complete ===\n")
 
     def combineData(self, json_files, sort_key=None):
@@ -122,21 +149,28 @@ class DatasetParser:
         - val_data: Validation dataset.
         - test_data: Testing dataset.
         """
-        if train_ratio + val_ratio + test_ratio != 1:
+        # Tolerance instead of an exact float compare: sums like 0.6+0.2+0.2
+        # land a few ulp away from 1.0
+        if abs(train_ratio + val_ratio + test_ratio - 1.0) > 1e-6:
             raise ValueError("Error: The sum of ratios must be equal to 1.")
 
         images = data['images']
         num_images = len(images)
         train_end = int(train_ratio * num_images)
-        val_end = train_end + int(val_ratio * num_images)
+        val_end = int((train_ratio + val_ratio) * num_images)
 
         train_images = images[:train_end]
         val_images = images[train_end:val_end]
         test_images = images[val_end:]
 
+        # Index annotations by image id once so each subset is a flat gather
+        # instead of a full scan over all annotations
+        anns_by_img = defaultdict(list)
+        for ann in data['annotations']:
+            anns_by_img[ann['image_id']].append(ann)
+
         def filter_annotations(images_set):
-            img_ids = {img['id'] for img in images_set}
-            return [ann for ann in data['annotations'] if ann['image_id'] in img_ids]
+            return [ann for img in images_set for ann in anns_by_img.get(img['id'], [])]
 
         train_annotations = filter_annotations(train_images)
         val_annotations = filter_annotations(val_images)
@@ -181,13 +215,64 @@ class DatasetParser:
             json_data = json_data['images']
             filenaming = 'file_name'
 
-        with tqdm(total=len(json_data), desc="Processing Images") as pbar:
-            for i in range(len(json_data)):
-                image_name = json_data[i][filenaming]
-                image = cv2.imread(os.path.join(image_path, image_name))
-                image = cv2.resize(image, (self.isz[1], self.isz[0]))
-                cv2.imwrite(os.path.join(output_path, image_name), image)
-                pbar.update(1)
+        # Parallelism lives at the image level, so keep OpenCV single-threaded
+        # to avoid oversubscribing the cores
+        cv2.setNumThreads(1)
+
+        # Let libjpeg decimate during decode when the target is much smaller
+        # than the 1200px sources, then finish with a small INTER_AREA resize
+        ratio = 1200 // self.isz[0]
+        if ratio >= 8:
+            read_flag, scale = cv2.IMREAD_REDUCED_COLOR_8, 8
+        elif ratio >= 4:
+            read_flag, scale = cv2.IMREAD_REDUCED_COLOR_4, 4
+        elif ratio >= 2:
+            read_flag, scale = cv2.IMREAD_REDUCED_COLOR_2, 2
+        else:
+            read_flag, scale = cv2.IMREAD_COLOR, 1
+
+        # Probe one source image: when the target size already matches, a raw
+        # copy avoids the decode/re-encode and the generational JPEG loss
+        identity_resize = False
+        if len(json_data) > 0:
+            probe = cv2.imread(os.path.join(image_path, json_data[0][filenaming]))
+            identity_resize = probe is not None and probe.shape[0] == self.isz[0] and probe.shape[1] == self.isz[1]
+
+        # One preallocated output buffer per worker thread: the tight loop
+        # stops reallocating a target-size image for every file
+        local_buf = threading.local()
+
+        def resize_one(entry):
+            image_name = entry[filenaming]
+            src = os.path.join(image_path, image_name)
+            dst = os.path.join(output_path, image_name)
+            if identity_resize:
+                shutil.copyfile(src, dst)
+                return
+            dst_buf = getattr(local_buf, 'dst', None)
+            if dst_buf is None:
+                dst_buf = local_buf.dst = np.empty((self.isz[0], self.isz[1], 3), np.uint8)
+            if _turbo_jpeg is not None and os.path.splitext(image_name)[1].lower() in ('.jpg', '.jpeg'):
+                with open(src, 'rb') as f:
+                    image = _turbo_jpeg.decode(f.read(), scaling_factor=(1, scale), pixel_format=TJPF_BGR)
+                cv2.resize(image, (self.isz[1], self.isz[0]), dst=dst_buf, interpolation=cv2.INTER_AREA)
+                with open(dst, 'wb') as f:
+                    f.write(_turbo_jpeg.encode(dst_buf, quality=90, pixel_format=TJPF_BGR))
+            else:
+                image = cv2.imread(src, read_flag)
+                cv2.resize(image, (self.isz[1], self.isz[0]), dst=dst_buf, interpolation=cv2.INTER_AREA)
+                ext = os.path.splitext(image_name)[1] or '.jpg'
+                params = [cv2.IMWRITE_JPEG_QUALITY, 90] if ext.lower() in ('.jpg', '.jpeg') else []
+                # imencode + raw write skips imwrite's per-call filename handling
+                _, encoded = cv2.imencode(ext, dst_buf, params)
+                with open(dst, 'wb') as f:
+                    f.write(encoded)
+
+        # OpenCV and the image codecs release the GIL, so threads scale here
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            with tqdm(total=len(json_data), desc="Processing Images") as pbar:
+                for _ in executor.map(resize_one, json_data):
+                    pbar.update(1)
 
     def processCameraPrm(self):
         """
@@ -217,12 +302,11 @@ class DatasetParser:
         new_ccx = camera_params['ccx'] * scale_width
         new_ccy = camera_params['ccy'] * scale_height
         
-        # Adjust the camera matrix
-        new_camera_matrix = [
-            [camera_params['cameraMatrix'][0][0] * scale_width, 0, new_ccx],
-            [0, camera_params['cameraMatrix'][1][1] * scale_height, new_ccy],
-            [0, 0, 1]
-        ]
+        # Adjust the camera matrix: left-multiplying by the scale matrix
+        # rescales the whole intrinsics (focal lengths and principal point)
+        K = np.asarray(camera_params['cameraMatrix'], dtype=float)
+        S = np.diag([scale_width, scale_height, 1.0])
+        new_camera_matrix = (S @ K).tolist()
         
         # Prepare the new camera parameters dictionary
         new_camera_params = {
@@ -274,11 +358,56 @@ class DatasetParser:
         Zips the output directory.
         """
         print("=== Zipping Output Directory ===")
-        zipf = zipfile.ZipFile(f'{self.output_dir}.zip', 'w', zipfile.ZIP_DEFLATED)
-        for root, dirs, files in os.walk(self.output_dir):
-            for file in files:
-                zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), os.path.join(self.output_dir, '..')))
-        zipf.close()
+        # Images are already entropy-coded, so store them as-is and only
+        # deflate the text entries (annotations, README)
+        stored_exts = {'.jpg', '.jpeg', '.png'}
+
+        # scandir recursion reuses the cached entry types instead of the
+        # extra stat calls os.walk issues per file
+        def iter_files(dir_path):
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from iter_files(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        # Pipeline cache files are not dataset content
+                        if entry.name.startswith(('otmp_', '.manifest')):
+                            continue
+                        yield entry.path
+
+        # Reader threads pull file bodies off disk (the GIL is released during
+        # reads) and feed a bounded queue; ZipFile is not thread-safe, so a
+        # single consumer appends the entries
+        queue = Queue(maxsize=64)
+        done = object()
+
+        def read_files(paths):
+            # The sentinel goes out even when a read fails, otherwise the
+            # consumer would wait on the queue forever
+            try:
+                for file_path in paths:
+                    arcname = os.path.relpath(file_path, os.path.join(self.output_dir, '..'))
+                    with open(file_path, 'rb') as f:
+                        queue.put((arcname, os.path.splitext(file_path)[1].lower(), f.read()))
+            finally:
+                queue.put(done)
+
+        paths = list(iter_files(self.output_dir))
+        workers = min(8, os.cpu_count() or 1)
+        with zipfile.ZipFile(f'{self.output_dir}.zip', 'w', allowZip64=True) as zipf, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(read_files, paths[w::workers]) for w in range(workers)]
+            remaining = workers
+            while remaining > 0:
+                item = queue.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                arcname, ext, payload = item
+                compress_type = zipfile.ZIP_STORED if ext in stored_exts else zipfile.ZIP_DEFLATED
+                zipf.writestr(arcname, payload, compress_type=compress_type, compresslevel=1)
+            for future in futures:
+                future.result()  # surface reader errors instead of dropping them
         print("Output directory zipped.")
         shutil.rmtree(self.output_dir)
     
@@ -287,18 +416,41 @@ class DatasetParser:
         Parses the dataset.
         """
         print("=== Step 1: Parsing Dataset ===")
-        for dt in self.data_type:
+
+        def run_blender(dt, di):
             print(f"--- Processing Data Type: {dt} ---")
             path = os.path.join(self.data_dir, dt)
-            files = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.json')]
+            with os.scandir(path) as it:
+                files = [entry.path for entry in it if entry.is_file() and entry.name.endswith('.json')]
+
+            # Skip Blender entirely when the input files and parameters have
+            # not changed since the last run; the sampling is seeded, so the
+            # cached annotations are still valid
+            manifest_key = hashlib.blake2b(json.dumps({
+                'files': sorted([file, os.path.getmtime(file)] for file in files),
+                'sz': self.sz,
+                'isz': self.isz,
+                'seed': self.seed,
+            }, sort_keys=True).encode()).hexdigest()
+            manifest_file = os.path.join(self.output_dir, f'.manifest_{dt}')
+            otmp_file = os.path.join(self.output_dir, f'otmp_{dt}.json')
+            if os.path.exists(manifest_file) and os.path.exists(otmp_file):
+                with open(manifest_file) as f:
+                    if f.read().strip() == manifest_key:
+                        print(f"Inputs unchanged for {dt}, reusing cached annotations.")
+                        return loadJson(otmp_file)
+
             data = [loadJson(file) for file in files]
             data = self.combineData(data)
-            data = random.sample(data, int(self.sz * len(data)))
+            # Sample indices instead of shuffling dict references around.
+            # Each data type gets its own generator derived from the seed:
+            # a shared one drawn from concurrent threads would make the
+            # subset depend on scheduling order
+            rng = np.random.default_rng([self.seed, di])
+            k = int(self.sz * len(data))
+            idx = rng.choice(len(data), k, replace=False)
+            data = [data[i] for i in idx.tolist()]
 
-            itmp_file = os.path.join(self.output_dir, 'itmp.json')
-            otmp_file = os.path.join(self.output_dir, 'otmp.json')
-
-            saveJson(data, itmp_file)
             print(f"Number of Data Samples: {len(data)}")
 
             # Blender processing
@@ -308,18 +460,38 @@ class DatasetParser:
             script_file = self.blender_params['blender_script']
             args = [
                 '--root', self.root_dir,
-                '--input-file', itmp_file,
+                '--input-stdin',
                 '--output-file', otmp_file,
                 '--image-height', str(self.isz[0]),
                 '--image-width', str(self.isz[1])
                 ]
             command = [exec_path, '-b', env_file, '-P', script_file, '--'] + args
             print(f"Running Blender Command: {command}")
-            subprocess.run(command)
+            # Pipe the sampled poses straight to Blender instead of writing an
+            # itmp.json for it to re-read; the result stays a file since
+            # Blender's own prints would pollute a stdout pipe
+            payload = orjson.dumps(data) if orjson is not None else json.dumps(data).encode()
+            # check=True: a failed run must not fall through to a stale
+            # otmp file and poison the manifest cache
+            subprocess.run(command, input=payload, check=True)
             print("Blender Processing Completed.")
             print('-' * 60)
 
             data = loadJson(otmp_file)
+            # The otmp file doubles as the cache for the manifest skip path;
+            # the manifest is only written once the run succeeded
+            with open(manifest_file, 'w') as f:
+                f.write(manifest_key)
+            return data
+
+        # The data types are independent, so their Blender runs overlap;
+        # threads suffice because the heavy work happens in the subprocesses
+        with ThreadPoolExecutor(max_workers=max(len(self.data_type), 1)) as executor:
+            futures = {dt: executor.submit(run_blender, dt, di) for di, dt in enumerate(self.data_type)}
+
+        for dt in self.data_type:
+            data = futures[dt].result()
+            path = os.path.join(self.data_dir, dt)
 
             if dt == 'synthetic':
                 train, validation, test = self.splitCocoData(data, train_ratio=self.trr, val_ratio=self.var, test_ratio=self.tsr)
@@ -338,16 +510,14 @@ class DatasetParser:
 
                 save_path = os.path.join(self.output_dir, f'{dt}/annotations')
                 os.makedirs(save_path, exist_ok=True)
-                saveJson(out_data, os.path.join(save_path, f'{output_type}.json'))
+                saveJson(out_data, os.path.join(save_path, f'{output_type}.json'), pretty=False)
 
                 os.makedirs(os.path.join(self.output_dir, f'{dt}/images/{output_type}'), exist_ok=True)
                 print(f"Processing Images for {dt}/{output_type}...")
                 image_path = os.path.join(path, 'images')
                 output_path = os.path.join(self.output_dir, f'{dt}/images/{output_type}')
                 self.processImgs(out_data, image_path, output_path)
-        
-        os.remove(itmp_file)
-        os.remove(otmp_file)
+
         print("=== Dataset Parsing Completed===")
         self.processPrms()  # Process camera and keypoints parameters
         if self.zo: